@@ -1,10 +1,16 @@
 import streamlit as st
 import pandas as pd
 import requests
+import aiohttp
+import asyncio
 import math
 import numpy as np
+import xlsxwriter
+import sqlite3
+import hashlib
+import re
+import os
 from io import BytesIO
-import time
 
 # Configure the Streamlit page
 st.set_page_config(
@@ -13,14 +19,104 @@ st.set_page_config(
     layout="wide"
 )
 
+# Persistent zip -> coordinates cache shared across sessions and restarts
+ZIP_CACHE_DB = "zip_cache.sqlite"
+
+# Parquet snapshots of processed uploads, keyed by a hash of the file bytes
+SNAPSHOT_DIR = "cache"
+
+# Part of the snapshot file name - bump whenever the processed frame's columns or dtypes change
+SNAPSHOT_VERSION = 1
+
+# Low-cardinality text columns stored as categoricals to save memory
+CATEGORY_COLUMNS = ['state', 'city', 'make', 'model']
+
+# Count columns that can safely be downcast to smaller integer types
+COUNT_COLUMNS = ['avg_transactions', 'most_recent_month_trx']
+
+# Leading 5-digit part of a cleaned zip: 1-5 digits ending the zip or followed by a
+# ZIP+4 hyphen, or the first 5 of a 9-digit zip written without the hyphen
+ZIP_PATTERN = re.compile(r'^(\d{1,5}(?=-|$)|\d{5}(?=\d{4}(?:-|$)))')
+
+# Up to this radius the flat-earth distance is within a tiny fraction of Haversine
+EQUIRECT_MAX_MILES = 50
+
+# Number of closest results shown in the table before "Show all" is ticked
+DISPLAY_ROWS = 500
+
 class ATMSearchTool:
     def __init__(self):
         self.df = None
         self.invalid_zips_df = None
         self.zip_coords_cache = {}
+        self._clear_coord_cache()
+        
+        # Zips whose last lookup failed for a transient reason (network, timeout, server error)
+        self.retry_zips = set()
+        
+        # Streamlit reruns may land on a different thread, so allow cross-thread use
+        self._conn = None
+        try:
+            self._conn = sqlite3.connect(ZIP_CACHE_DB, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS zip_cache (zip TEXT PRIMARY KEY, lat REAL, lon REAL)"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            # A read-only disk shouldn't break the app - run with the in-memory cache only
+            self.close()
+    
+    def close(self):
+        """Close the on-disk zip cache connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def _load_cached_zips(self, zips):
+        """Prefill the in-memory cache with any zip codes already stored on disk"""
+        if self._conn is None:
+            return
+        
+        zips = [str(zip_code) for zip_code in zips]
+        
+        try:
+            # Stay well under SQLite's limit on bound parameters per query
+            for start in range(0, len(zips), 500):
+                chunk = zips[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT zip, lat, lon FROM zip_cache WHERE zip IN ({placeholders})", chunk
+                ).fetchall()
+                
+                for zip_code, lat, lon in rows:
+                    self.zip_coords_cache[zip_code] = {'latitude': lat, 'longitude': lon}
+        except sqlite3.Error as e:
+            # An unreadable cache just means falling back to the API
+            pass
+    
+    def _save_cached_zips(self, zip_coords):
+        """Persist successful lookups so later sessions don't need the API"""
+        rows = [
+            (str(zip_code), coords['latitude'], coords['longitude'])
+            for zip_code, coords in zip_coords.items()
+            if coords['latitude'] is not None
+        ]
+        
+        if not rows or self._conn is None:
+            return
+        
+        try:
+            self._conn.executemany("INSERT OR REPLACE INTO zip_cache (zip, lat, lon) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            # A read-only disk shouldn't break the app, it just loses persistence
+            pass
         
     def get_zip_coordinates(self, zip_code):
         """Get coordinates for a zip code using free API"""
+        if zip_code not in self.zip_coords_cache:
+            self._load_cached_zips([zip_code])
+        
         if zip_code in self.zip_coords_cache:
             return self.zip_coords_cache[zip_code]
         
@@ -35,6 +131,7 @@ class ATMSearchTool:
                 lon = float(data['places'][0]['longitude'])
                 coords = {'latitude': lat, 'longitude': lon}
                 self.zip_coords_cache[zip_code] = coords
+                self._save_cached_zips({zip_code: coords})
                 return coords
             else:
                 self.zip_coords_cache[zip_code] = {'latitude': None, 'longitude': None}
@@ -44,6 +141,83 @@ class ATMSearchTool:
             self.zip_coords_cache[zip_code] = {'latitude': None, 'longitude': None}
             return {'latitude': None, 'longitude': None}
     
+    async def _fetch_zip(self, session, zip_code, sem):
+        """Fetch coordinates for a single zip code without blocking the other lookups
+        
+        Returns (zip_code, coords, retryable) - retryable is True when the lookup failed
+        for a transient reason and a later attempt might succeed.
+        """
+        try:
+            url = f"https://api.zippopotam.us/us/{zip_code}"
+            
+            # The semaphore caps concurrent requests to be respectful to the API
+            async with sem, session.get(url) as response:
+                if response.status == 200:
+                    data = await response.json(content_type=None)
+                    lat = float(data['places'][0]['latitude'])
+                    lon = float(data['places'][0]['longitude'])
+                    return zip_code, {'latitude': lat, 'longitude': lon}, False
+                
+                # A 404 means the zip doesn't exist - only rate limiting and server errors are worth retrying
+                retryable = response.status == 429 or response.status >= 500
+                return zip_code, {'latitude': None, 'longitude': None}, retryable
+                    
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Network problems and timeouts say nothing about the zip itself
+            return zip_code, {'latitude': None, 'longitude': None}, True
+        except Exception as e:
+            pass
+        
+        return zip_code, {'latitude': None, 'longitude': None}, False
+    
+    async def _gather_zips(self, zips, progress_callback=None):
+        """Look up many zip codes concurrently over one shared HTTP session"""
+        sem = asyncio.Semaphore(10)
+        results = {}
+        retry_zips = set()
+        
+        timeout = aiohttp.ClientTimeout(total=5)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            tasks = [self._fetch_zip(session, zip_code, sem) for zip_code in zips]
+            
+            for i, task in enumerate(asyncio.as_completed(tasks)):
+                zip_code, coords, retryable = await task
+                results[zip_code] = coords
+                
+                if retryable:
+                    retry_zips.add(zip_code)
+                
+                if progress_callback is not None:
+                    progress_callback((i + 1) / len(tasks))
+        
+        return results, retry_zips
+    
+    def _fetch_zips_bulk(self, zips, progress_callback=None):
+        """Get coordinates for a batch of zip codes, only hitting the API for uncached ones"""
+        missing = [zip_code for zip_code in zips if zip_code not in self.zip_coords_cache]
+        
+        # Check the on-disk cache before going to the network
+        if missing:
+            self._load_cached_zips(missing)
+            missing = [zip_code for zip_code in missing if zip_code not in self.zip_coords_cache]
+        
+        if missing:
+            fetched, retry_zips = asyncio.run(self._gather_zips(missing, progress_callback))
+            self._save_cached_zips(fetched)
+            
+            # Transient failures stay out of the cache so the next lookup tries the API again
+            self.retry_zips.difference_update(fetched)
+            self.retry_zips.update(retry_zips)
+            self.zip_coords_cache.update(
+                (zip_code, coords) for zip_code, coords in fetched.items() if zip_code not in retry_zips
+            )
+        else:
+            fetched = {}
+            if progress_callback is not None:
+                progress_callback(1.0)
+        
+        return {zip_code: self.zip_coords_cache.get(zip_code, fetched.get(zip_code)) for zip_code in zips}
+    
     def haversine_distance(self, lat1, lon1, lat2, lon2):
         """Calculate distance between two points using Haversine formula"""
         # Convert decimal degrees to radians
@@ -59,12 +233,140 @@ class ATMSearchTool:
         r = 3956
         
         return c * r
+    
+    def _haversine_vec(self, lat1, lon1, lat2_rad, lon2_rad, cos_lat2, out=None):
+        """Vectorized Haversine distance from one point to precomputed radian arrays"""
+        # Only the search point needs converting - the arrays are already in radians
+        lat1, lon1 = math.radians(lat1), math.radians(lon1)
+        
+        # Evaluate the formula in place on two work arrays instead of allocating
+        # a fresh temporary for every intermediate step
+        a = np.subtract(lat2_rad, lat1, out=out)
+        a *= 0.5
+        np.sin(a, out=a)
+        a *= a
+        
+        b = np.subtract(lon2_rad, lon1)
+        b *= 0.5
+        np.sin(b, out=b)
+        b *= b
+        b *= cos_lat2
+        b *= math.cos(lat1)
+        
+        a += b
+        np.sqrt(a, out=a)
+        np.arcsin(a, out=a)
+        
+        # 2 * radius of earth in miles
+        a *= 2 * 3956
+        return a
+    
+    def _equirect_vec(self, lat1, lon1, lat2_rad, lon2_rad, cos_lat2, out=None):
+        """Equirectangular (flat-earth) distance approximation for short ranges"""
+        lat1, lon1 = math.radians(lat1), math.radians(lon1)
+        
+        # Wrap longitude differences into [-pi, pi) so nearby points across the antimeridian stay close
+        x = np.subtract(lon2_rad, lon1, out=out)
+        x += math.pi
+        np.mod(x, 2 * math.pi, out=x)
+        x -= math.pi
+        
+        # Mean of the two cosines stands in for cos(mid-latitude) without any extra trig
+        cos_mid = np.add(cos_lat2, math.cos(lat1))
+        cos_mid *= 0.5
+        x *= cos_mid
+        
+        y = np.subtract(lat2_rad, lat1)
+        
+        # Radius of earth in miles
+        d = np.hypot(x, y, out=x)
+        d *= 3956
+        return d
+    
+    def _clear_coord_cache(self):
+        """Drop the precomputed coordinate arrays (call whenever self.df is rebuilt)"""
+        self._lat_arr = None
+        self._lon_arr = None
+        self._lat_rad = None
+        self._lon_rad = None
+        self._cos_lat = None
+        self._valid_mask = None
+        self._lat_order = None
+        self._sorted_lat = None
+        self._dist_buf = None
+    
+    def _build_coord_cache(self):
+        """Precompute radian coordinates once so searches skip the per-row trig"""
+        lat = pd.to_numeric(self.df['latitude'], errors='coerce').to_numpy(dtype=np.float64)
+        lon = pd.to_numeric(self.df['longitude'], errors='coerce').to_numpy(dtype=np.float64)
+        
+        self._valid_mask = ~(np.isnan(lat) | np.isnan(lon))
+        self._lat_arr = lat
+        self._lon_arr = lon
+        self._lat_rad = np.deg2rad(lat)
+        self._lon_rad = np.deg2rad(lon)
+        self._cos_lat = np.cos(self._lat_rad)
+        
+        # Latitude-sorted index of the geocoded rows for binary-search range queries
+        valid_positions = np.flatnonzero(self._valid_mask)
+        self._lat_order = valid_positions[np.argsort(lat[valid_positions], kind='stable')]
+        self._sorted_lat = lat[self._lat_order]
+        
+        # Reusable output buffer so searches don't allocate a new distance array each time
+        self._dist_buf = np.empty(len(self.df), dtype=np.float64)
+        
+    def _bounding_box_candidates(self, search_lat, search_lon, radius_miles):
+        """Positions of ATMs inside the lat/lon box that encloses the search circle"""
+        angle = radius_miles / 3956
+        dlat_deg = math.degrees(angle)
+        
+        # Longitude span of the circle widens towards the poles
+        sin_ratio = math.sin(angle) / math.cos(math.radians(search_lat))
+        if angle >= math.pi / 2 or sin_ratio >= 1:
+            dlon_deg = 180.0
+        else:
+            dlon_deg = math.degrees(math.asin(sin_ratio))
+        
+        # The latitude band is a contiguous slice of the sorted index - no full scan needed
+        lo = np.searchsorted(self._sorted_lat, search_lat - dlat_deg, side='left')
+        hi = np.searchsorted(self._sorted_lat, search_lat + dlat_deg, side='right')
+        band = self._lat_order[lo:hi]
         
+        # Wrap longitude differences into [-180, 180) so the box works across the antimeridian
+        dlon = (self._lon_arr[band] - search_lon + 180) % 360 - 180
+        
+        return band[np.abs(dlon) <= dlon_deg]
+    
     def load_excel_file(self, uploaded_file):
-        """Load and process the Excel file"""
+        """Load and process the Excel file, reusing cached results for identical uploads"""
+        # Any previously cached coordinate arrays belong to the old data
+        self._clear_coord_cache()
+        
+        # Key the cache on the raw file bytes so re-uploads of the same file are free
+        try:
+            df, invalid_zips_df = _load_and_enrich(uploaded_file.getvalue())
+        except _UncachedLoad as e:
+            df, invalid_zips_df = e.df, e.invalid_zips_df
+        
+        if df is None:
+            return False
+        
+        self.df = df
+        self.invalid_zips_df = invalid_zips_df
+        
+        # Cache coordinate arrays for fast repeated searches
+        self._build_coord_cache()
+        
+        return True
+    
+    def _process_excel(self, file_bytes):
+        """Parse, clean and geocode the raw Excel file"""
         try:
-            # Read Excel file
-            self.df = pd.read_excel(uploaded_file)
+            # Read Excel file - the Rust-backed calamine engine is much faster when available
+            try:
+                self.df = pd.read_excel(BytesIO(file_bytes), engine='calamine')
+            except (ImportError, ValueError):
+                self.df = pd.read_excel(BytesIO(file_bytes))
             
             # Clean and standardize column names (case insensitive)
             self.df.columns = self.df.columns.str.strip().str.lower()
@@ -130,6 +432,8 @@ class ATMSearchTool:
             # Add lat/lon columns if they don't exist
             if 'latitude' not in self.df.columns or 'longitude' not in self.df.columns:
                 self.add_coordinates()
+            
+            self._optimize_dtypes()
                 
             return True
             
@@ -137,65 +441,54 @@ class ATMSearchTool:
             st.error(f"Error loading file: {str(e)}")
             return False
     
+    def _optimize_dtypes(self):
+        """Drop scratch columns and shrink dtypes so filters and copies touch fewer bytes"""
+        # The working/cleaned zip columns are only needed for validation - 'zip' holds the cleaned value
+        self.df = self.df.drop(columns=['working_zip', 'cleaned_zip'], errors='ignore')
+        
+        for col in ['latitude', 'longitude']:
+            self.df[col] = pd.to_numeric(self.df[col], errors='coerce').astype(np.float32)
+        
+        for col in CATEGORY_COLUMNS:
+            if col in self.df.columns:
+                self.df[col] = self.df[col].astype('category')
+        
+        for col in COUNT_COLUMNS:
+            if col in self.df.columns and pd.api.types.is_numeric_dtype(self.df[col]):
+                self.df[col] = pd.to_numeric(self.df[col], downcast='integer')
+    
     def process_zip_codes(self, zip_source):
         """Process and validate zip codes, separating valid from invalid"""
         
         st.info(f"Processing zip codes from '{zip_source}' column...")
         
-        # Convert to string and handle various formats
-        self.df['working_zip'] = self.df['working_zip'].astype(str)
-        
-        # Clean zip codes - remove any non-digit characters except hyphens
-        self.df['working_zip'] = self.df['working_zip'].str.replace(r'[^\d-]', '', regex=True)
-        
-        # Handle different zip code formats
-        def clean_zip(zip_code):
-            if pd.isna(zip_code) or str(zip_code).lower() in ['nan', 'none', '']:
-                return None
-            
-            zip_str = str(zip_code).strip()
-            
-            # Remove any leading/trailing spaces
-            zip_str = zip_str.strip()
-            
-            # Handle ZIP+4 format (12345-6789 -> 12345)
-            if '-' in zip_str:
-                zip_str = zip_str.split('-')[0]
-            
-            # Pad with leading zeros if less than 5 digits
-            if zip_str.isdigit():
-                if len(zip_str) <= 5:
-                    return zip_str.zfill(5)
-                elif len(zip_str) == 9:  # Handle 9-digit zip without hyphen
-                    return zip_str[:5]
-            
-            return None
+        # Convert to string and remove any non-digit characters except hyphens in one chain
+        working_zip = self.df['working_zip'].astype(str).str.replace(r'[^\d-]', '', regex=True)
+        self.df['working_zip'] = working_zip
         
-        # Apply cleaning function
-        self.df['cleaned_zip'] = self.df['working_zip'].apply(clean_zip)
+        # One regex pass handles ZIP+4 (12345-6789 -> 12345) and 9-digit zips,
+        # then pad with leading zeros if less than 5 digits
+        self.df['cleaned_zip'] = working_zip.str.extract(ZIP_PATTERN, expand=False).str.zfill(5)
         
-        # Identify valid and invalid zip codes
-        valid_mask = (
-            self.df['cleaned_zip'].notna() & 
-            (self.df['cleaned_zip'].str.len() == 5) & 
-            (self.df['cleaned_zip'].str.isdigit())
-        )
+        # ZIP_PATTERN only captures digits, so every match is already a valid 5-digit zip
+        valid_mask = self.df['cleaned_zip'].notna().to_numpy()
         
-        # Separate valid and invalid records
+        # Separate valid and invalid records - only the valid frame is modified below, so it
+        # is the only one that needs a real copy
         valid_df = self.df[valid_mask].copy()
-        invalid_df = self.df[~valid_mask].copy()
+        invalid_df = self.df[~valid_mask]
         
         # Store invalid zip codes for review
         if len(invalid_df) > 0:
-            self.invalid_zips_df = invalid_df.copy()
+            self.invalid_zips_df = invalid_df
             
             # Create a summary of invalid zip issues
-            invalid_df['zip_issue'] = invalid_df.apply(lambda row: self.diagnose_zip_issue(row['working_zip'], row['cleaned_zip']), axis=1)
+            zip_issues = self.diagnose_zip_issues(invalid_df['working_zip'])
             
             st.warning(f"⚠️ Found {len(invalid_df)} records with invalid zip codes")
             
             # Show summary of issues
-            issue_summary = invalid_df['zip_issue'].value_counts()
+            issue_summary = zip_issues.value_counts()
             st.write("**Invalid zip code issues:**")
             for issue, count in issue_summary.items():
                 st.write(f"- {issue}: {count} records")
@@ -203,36 +496,37 @@ class ATMSearchTool:
             st.success("✅ All zip codes are valid")
         
         # Update main dataframe to only include valid records
-        self.df = valid_df.copy()
+        self.df = valid_df
         self.df['zip'] = self.df['cleaned_zip']  # Use cleaned zip as the main zip column
         
         st.info(f"Processed {len(self.df)} records with valid zip codes")
     
-    def diagnose_zip_issue(self, original_zip, cleaned_zip):
-        """Diagnose what's wrong with an invalid zip code"""
-        if pd.isna(original_zip) or str(original_zip).lower() in ['nan', 'none', '']:
-            return "Missing/Empty zip code"
-        
-        original_str = str(original_zip).strip()
-        
-        if not original_str:
-            return "Empty zip code"
-        
-        if not any(c.isdigit() for c in original_str):
-            return "No digits in zip code"
-        
-        digits_only = ''.join(c for c in original_str if c.isdigit())
-        
-        if len(digits_only) < 5:
-            return f"Too few digits ({len(digits_only)} digits)"
-        
-        if len(digits_only) > 9:
-            return f"Too many digits ({len(digits_only)} digits)"
-        
-        if len(digits_only) in [6, 7, 8]:
-            return f"Unusual zip length ({len(digits_only)} digits)"
-        
-        return "Other zip format issue"
+    def diagnose_zip_issues(self, working_zips):
+        """Diagnose what's wrong with each invalid zip code in a column"""
+        zip_str = working_zips.astype(str).str.strip()
+        
+        # Blank cells can stay NaN through astype(str) - count them as zero digits so the
+        # counts stay integers ("6 digits", not "6.0 digits")
+        digit_counts = zip_str.str.count(r'\d').fillna(0).astype(int)
+        count_str = digit_counts.astype(str)
+        
+        conditions = [
+            working_zips.isna() | zip_str.str.lower().isin(['nan', 'none', '']),
+            digit_counts == 0,
+            digit_counts < 5,
+            digit_counts > 9,
+            digit_counts.isin([6, 7, 8]),
+        ]
+        choices = [
+            "Missing/Empty zip code",
+            "No digits in zip code",
+            "Too few digits (" + count_str + " digits)",
+            "Too many digits (" + count_str + " digits)",
+            "Unusual zip length (" + count_str + " digits)",
+        ]
+        
+        issues = np.select(conditions, choices, default="Other zip format issue")
+        return pd.Series(issues, index=working_zips.index, dtype=object)
     
     def add_coordinates(self):
         """Add latitude and longitude coordinates for all ATMs"""
@@ -241,28 +535,20 @@ class ATMSearchTool:
         # Get unique zip codes to minimize API calls
         unique_zips = self.df['zip'].unique()
         
-        # Create a mapping of zip codes to coordinates
-        zip_coords = {}
+        # Create a mapping of zip codes to coordinates with concurrent lookups
         progress_bar = st.progress(0)
         
-        failed_zips = []
+        zip_coords = self._fetch_zips_bulk(unique_zips, progress_bar.progress)
         
-        for i, zip_code in enumerate(unique_zips):
-            # Add small delay to be respectful to the API
-            if i > 0 and i % 10 == 0:
-                time.sleep(1)
-            
-            coords = self.get_zip_coordinates(zip_code)
-            zip_coords[zip_code] = coords
-            
-            if coords['latitude'] is None:
-                failed_zips.append(zip_code)
-            
-            progress_bar.progress((i + 1) / len(unique_zips))
+        failed_zips = [zip_code for zip_code, coords in zip_coords.items() if coords['latitude'] is None]
         
         # Map coordinates to the dataframe
-        self.df['latitude'] = self.df['zip'].map(lambda x: zip_coords.get(x, {}).get('latitude'))
-        self.df['longitude'] = self.df['zip'].map(lambda x: zip_coords.get(x, {}).get('longitude'))
+        # Mapping through a Series is a hash join in C rather than a Python call per row
+        lat_map = pd.Series({zip_code: coords['latitude'] for zip_code, coords in zip_coords.items()}, dtype='float32')
+        lon_map = pd.Series({zip_code: coords['longitude'] for zip_code, coords in zip_coords.items()}, dtype='float32')
+        
+        self.df['latitude'] = self.df['zip'].map(lat_map)
+        self.df['longitude'] = self.df['zip'].map(lon_map)
         
         if failed_zips:
             st.warning(f"Could not find coordinates for {len(failed_zips)} zip codes: {failed_zips[:10]}{'...' if len(failed_zips) > 10 else ''}")
@@ -282,34 +568,33 @@ class ATMSearchTool:
             search_lat = search_coords['latitude']
             search_lon = search_coords['longitude']
             
-            # Calculate distances for all ATMs
-            distances = []
+            if self._lat_rad is None:
+                self._build_coord_cache()
             
-            for _, row in self.df.iterrows():
-                if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-                    # Calculate distance using Haversine formula
-                    distance_miles = self.haversine_distance(
-                        search_lat, search_lon, 
-                        row['latitude'], row['longitude']
-                    )
-                    distances.append(distance_miles)
-                else:
-                    distances.append(float('inf'))
+            # Cheap bounding-box pre-filter so Haversine only runs on nearby ATMs
+            candidates = self._bounding_box_candidates(search_lat, search_lon, radius_miles)
             
-            # Add distance column
-            self.df['distance_miles'] = distances
+            # Small radii can use the cheaper flat-earth approximation
+            if radius_miles <= EQUIRECT_MAX_MILES:
+                distance_fn = self._equirect_vec
+            else:
+                distance_fn = self._haversine_vec
+            
+            dist = distance_fn(
+                search_lat, search_lon,
+                self._lat_rad[candidates], self._lon_rad[candidates], self._cos_lat[candidates],
+                out=self._dist_buf[:len(candidates)]
+            )
             
-            # Filter by radius and remove invalid distances
-            filtered_df = self.df[
-                (self.df['distance_miles'] <= radius_miles) & 
-                (self.df['distance_miles'] != float('inf'))
-            ].copy()
+            # Filter by radius and sort by distance on the small arrays, leaving self.df untouched
+            in_radius = dist <= radius_miles
+            hits, dist = candidates[in_radius], dist[in_radius]
             
-            # Sort by distance
-            filtered_df = filtered_df.sort_values('distance_miles')
+            order = np.argsort(dist, kind='stable')
+            hits, dist = hits[order], dist[order]
             
-            # Round distance for display
-            filtered_df['distance_miles'] = filtered_df['distance_miles'].round(2)
+            # Only the matching rows are copied out, with distance rounded for display
+            filtered_df = self.df.iloc[hits].assign(distance_miles=dist.round(2))
             
             return filtered_df
             
@@ -317,30 +602,106 @@ class ATMSearchTool:
             st.error(f"Error searching ATMs: {str(e)}")
             return pd.DataFrame()
     
-    def export_results(self, results_df):
-        """Export search results to Excel"""
+    def _to_excel_bytes(self, df, sheet_name):
+        """Write a DataFrame to xlsx bytes, streaming rows with xlsxwriter's constant_memory mode"""
         output = BytesIO()
         
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            results_df.to_excel(writer, sheet_name='ATM_Search_Results', index=False)
-            
+        # constant_memory flushes each row to disk once the next one starts, so rows must be
+        # written strictly in order. pandas' to_excel writes column by column and would lose
+        # data in this mode, so the rows are written directly instead.
+        workbook = xlsxwriter.Workbook(output, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        })
+        worksheet = workbook.add_worksheet(sheet_name)
+        
+        # Match the header style pandas uses
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+        
+        for row_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
+            # Missing values become blank cells, as with to_excel
+            worksheet.write_row(row_idx, 0, [None if pd.isna(value) else value for value in row])
+        
+        workbook.close()
         return output.getvalue()
     
+    def export_results(self, results_df):
+        """Export search results to Excel"""
+        return self._to_excel_bytes(results_df, 'ATM_Search_Results')
+    
     def export_invalid_zips(self):
         """Export invalid zip codes to Excel for review"""
         if self.invalid_zips_df is not None:
-            output = BytesIO()
-            
             # Add issue diagnosis
             export_df = self.invalid_zips_df.copy()
-            export_df['zip_issue'] = export_df.apply(lambda row: self.diagnose_zip_issue(row['working_zip'], row.get('cleaned_zip')), axis=1)
+            export_df['zip_issue'] = self.diagnose_zip_issues(export_df['working_zip'])
             
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                export_df.to_excel(writer, sheet_name='Invalid_Zip_Codes', index=False)
-                
-            return output.getvalue()
+            return self._to_excel_bytes(export_df, 'Invalid_Zip_Codes')
         return None
 
+class _UncachedLoad(Exception):
+    """Carries a load result out of _load_and_enrich without st.cache_data storing it"""
+    def __init__(self, df, invalid_zips_df):
+        super().__init__("load result should not be cached")
+        self.df = df
+        self.invalid_zips_df = invalid_zips_df
+
+@st.cache_data(ttl=24*3600, max_entries=10, show_spinner=False)
+def _load_and_enrich(file_bytes):
+    """Run the Excel load pipeline once per distinct file and cache the resulting frames
+    
+    Failed loads and loads with transient geocoding failures are raised as _UncachedLoad
+    (st.cache_data never caches exceptions), so the next load of that file tries again.
+    """
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    df_path = os.path.join(SNAPSHOT_DIR, f"{digest}_v{SNAPSHOT_VERSION}.parquet")
+    invalid_path = os.path.join(SNAPSHOT_DIR, f"{digest}_v{SNAPSHOT_VERSION}_invalid.parquet")
+    
+    # A snapshot from an earlier run skips Excel parsing and geocoding entirely
+    if os.path.exists(df_path):
+        try:
+            df = pd.read_parquet(df_path)
+            invalid_zips_df = pd.read_parquet(invalid_path) if os.path.exists(invalid_path) else None
+            return df, invalid_zips_df
+        except Exception as e:
+            pass
+    
+    loader = ATMSearchTool()
+    
+    try:
+        loaded = loader._process_excel(file_bytes)
+    finally:
+        # The loader is thrown away, so release its zip cache connection
+        loader.close()
+    
+    if not loaded:
+        raise _UncachedLoad(None, None)
+    
+    # Don't snapshot a load where lookups failed transiently - a later load should get
+    # another chance to geocode them instead of reusing the missing coordinates forever.
+    # Zips the API definitely doesn't know (e.g. 00000) don't block the snapshot.
+    if loader.retry_zips:
+        raise _UncachedLoad(loader.df, loader.invalid_zips_df)
+    
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        
+        # Write the invalid records first so the main snapshot only exists once both are complete
+        if loader.invalid_zips_df is not None:
+            loader.invalid_zips_df.to_parquet(invalid_path)
+        loader.df.to_parquet(df_path)
+    except Exception as e:
+        # Mixed-type columns can't always be stored as parquet - just skip the snapshot
+        pass
+    
+    return loader.df, loader.invalid_zips_df
+
+def _clear_search_results():
+    """Forget the last search so its table, download and map stop showing"""
+    for key in ('search_results', 'search_params', 'search_excel'):
+        st.session_state.pop(key, None)
+
 def main():
     st.title("🏧 ATM Location Search Tool")
     st.markdown("Search for ATMs within a specified radius of any US zip code")
@@ -370,6 +731,9 @@ def main():
                         st.success(f"✅ Loaded {len(search_tool.df)} ATM records with valid zip codes")
                         st.session_state.data_loaded = True
                         
+                        # Results from a previous search belong to the old dataset
+                        _clear_search_results()
+                        
                         # Show invalid zips download option
                         if search_tool.invalid_zips_df is not None:
                             invalid_count = len(search_tool.invalid_zips_df)
@@ -453,45 +817,64 @@ def main():
                     results = search_tool.search_atms_by_radius(search_zip, radius_miles)
                     
                     if not results.empty:
-                        st.success(f"Found {len(results)} ATMs within {radius_miles} miles of {search_zip}")
-                        
-                        # Display results
-                        st.subheader("Search Results")
-                        
-                        # Select key columns to display
-                        key_columns = [
-                            'terminal', 'location', 'address', 'city', 'state', 'zip', 
-                            'distance_miles', 'make', 'model', 'avg_transactions', 
-                            'avg_cash_dispensed', 'permanent_or_temp', 'inside_or_outside'
-                        ]
-                        
-                        # Only show columns that exist in the data
-                        display_columns = [col for col in key_columns if col in results.columns]
-                        
-                        # Display the filtered dataframe
-                        st.dataframe(
-                            results[display_columns],
-                            use_container_width=True,
-                            hide_index=True
-                        )
-                        
-                        # Download button
-                        excel_data = search_tool.export_results(results)
-                        st.download_button(
-                            label="📥 Download Results as Excel",
-                            data=excel_data,
-                            file_name=f"atm_search_{search_zip}_{radius_miles}miles.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                        
-                        # Store results in session state for map display
+                        # Store results in session state so they survive reruns (paging, downloads, map)
                         st.session_state.search_results = results
+                        st.session_state.search_params = (search_zip, radius_miles)
+                        
+                        # Build the Excel export once per search rather than on every rerun
+                        st.session_state.search_excel = search_tool.export_results(results)
                         
                     else:
+                        _clear_search_results()
                         st.warning(f"No ATMs found within {radius_miles} miles of {search_zip}")
             else:
+                _clear_search_results()
                 st.error("Please enter a valid 5-digit zip code")
         
+        # Display the most recent search results
+        if hasattr(st.session_state, 'search_results') and not st.session_state.search_results.empty:
+            results = st.session_state.search_results
+            result_zip, result_radius = st.session_state.search_params
+            
+            st.success(f"Found {len(results)} ATMs within {result_radius} miles of {result_zip}")
+            
+            # Display results
+            st.subheader("Search Results")
+            
+            # Select key columns to display
+            key_columns = [
+                'terminal', 'location', 'address', 'city', 'state', 'zip', 
+                'distance_miles', 'make', 'model', 'avg_transactions', 
+                'avg_cash_dispensed', 'permanent_or_temp', 'inside_or_outside'
+            ]
+            
+            # Only show columns that exist in the data
+            display_columns = [col for col in key_columns if col in results.columns]
+            
+            # Results are sorted by distance, so the first rows are the closest ATMs
+            show_all = False
+            if len(results) > DISPLAY_ROWS:
+                show_all = st.checkbox(f"Show all {len(results)} results")
+                if not show_all:
+                    st.caption(f"Showing the {DISPLAY_ROWS} closest ATMs - the download includes all results")
+            
+            display_df = results if show_all else results.head(DISPLAY_ROWS)
+            
+            # Display the filtered dataframe
+            st.dataframe(
+                display_df[display_columns],
+                use_container_width=True,
+                hide_index=True
+            )
+            
+            # Download button
+            st.download_button(
+                label="📥 Download Results as Excel",
+                data=st.session_state.search_excel,
+                file_name=f"atm_search_{result_zip}_{result_radius}miles.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+        
         # Optional: Display map if results exist
         if hasattr(st.session_state, 'search_results') and not st.session_state.search_results.empty:
             try: